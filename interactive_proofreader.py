@@ -2,26 +2,140 @@
 # interactive_proofreader.py
 #
 # Interactive LaTeX proofreading tool with LLM integration
-# pip install pylatexenc requests
+# pip install requests aiohttp
 #
 # Usage:
 #   python interactive_proofreader.py
 #   (Then follow the interactive prompts)
+#   python interactive_proofreader.py --batch
+#   (Same, but submits all requests as one cheaper Batch API job)
+#   Other options: --no-cache, --no-diff (see --help)
 
 import re
 import sys
 import requests
 import time
+import asyncio
+import random
+import aiohttp
 import subprocess
 import os
 import json
-from pylatexenc.latexwalker import LatexWalker, LatexMacroNode
+import bisect
+import hashlib
+import functools
+import shutil
+import sqlite3
+import argparse
+from collections import namedtuple
+from pathlib import Path
+
+try:
+    import orjson  # Optional: much faster JSON encoding/decoding of API payloads
+except ImportError:
+    orjson = None
 
 # Configuration will be loaded from config.json
 OPENROUTER_CONFIG = None
 
+# Responses from previous runs, keyed by model, system prompt and text;
+# opened by process_file unless caching is disabled
+CACHE_FILE = '.proofreader_cache.db'
+RESPONSE_CACHE = None
+
+# Shared keep-alive connection pool for the synchronous API calls (key test, Batch API);
+# concurrent proofreading uses a single aiohttp session created in _drive
+HTTP_SESSION = requests.Session()
+
+# A single piece of text to proofread: kind selects how the corrected text is
+# spliced back into the document, label is used for progress output
+Element = namedtuple('Element', ['kind', 'start', 'end', 'text', 'label'])
+
+# Elements shorter than this (section titles, keywords, short captions) are
+# proofread several at a time in one request to save network round-trips
+MARSHAL_MAX_CHARS = 200
+MARSHAL_BATCH_SIZE = 10
+
+# Elements longer than this are split at sentence boundaries and the pieces
+# proofread in parallel, keeping each request well within the model's context
+MAX_CHUNK_CHARS = 4000
+
+# Seconds allowed for establishing a connection (including DNS lookup and TLS)
+CONNECT_TIMEOUT = 10
+
+# Resolved API host addresses and idle keep-alive connections are reused for this long
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+
+# A streamed response that receives nothing for this many seconds is treated as
+# stalled and retried, rather than waiting for the full request timeout
+STREAM_STALL_TIMEOUT = 30
+
+# Seconds between status checks of a submitted Batch API job
+BATCH_POLL_INTERVAL = 60
+
+# LaTeX environments whose whole body is proofread as one element
+ENVIRONMENTS = ['abstract', 'highlights', 'keywords']
+
+_SECTION_MACROS = r'chapter|section|subsection|subsubsection|paragraph|subparagraph'
+
+# Start of every element the single-pass document scan cares about
+_TOKEN_RE = re.compile(
+    r'(?P<begin>\\begin\{(?P<env>' + '|'.join(ENVIRONMENTS) + r')\})'
+    r'|(?P<cap>\\caption\s*\{)'
+    r'|(?P<sec>\\(?P<macro>' + _SECTION_MACROS + r')\*?\s*(?:\[[^\]]*\]\s*)?\{)'
+    r'|(?P<para>\n\s*\n)'
+)
+
+# A % that starts a comment: not escaped as \%, though \\% (line break, then comment) is
+_COMMENT_RE = re.compile(r'(?<!\\)(?:\\\\)*%')
+
+# LaTeX command names, compared between a batched item and its source text
+_COMMAND_RE = re.compile(r'\\[a-zA-Z]+')
+
+# Control characters, e.g. \t or \b decoded from a JSON string where the model
+# wrote \textbf or \beta with a single backslash
+_CONTROL_CHAR_RE = re.compile(r'[\x00-\x1f\x7f]')
+
+# Macros and inline math, removed to measure how much prose a paragraph holds
+_MARKUP_RE = re.compile(r'\\[a-zA-Z]+|\$[^$]*\$')
+
+# Paragraphs with less prose than this are not worth an API call
+MIN_PROSE_CHARS = 20
+
+# Whitespace between the end of one sentence and the capitalized start of the next
+_SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z])')
+
+class RateLimiter:
+    """Token bucket allowing at most max_rate requests per time_period seconds"""
+    
+    def __init__(self, max_rate, time_period=60):
+        self.max_rate = max_rate
+        self.rate_per_sec = max_rate / time_period
+        self._level = 0.0
+        self._last_check = None
+    
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._last_check is not None:
+                # Drain the bucket for the time elapsed since the last request
+                self._level = max(0.0, self._level - (now - self._last_check) * self.rate_per_sec)
+            self._last_check = now
+            if self._level + 1 <= self.max_rate:
+                self._level += 1
+                return
+            await asyncio.sleep((self._level + 1 - self.max_rate) / self.rate_per_sec)
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+@functools.lru_cache(maxsize=1)
 def check_latexdiff_available():
-    """Check if latexdiff is available on the system"""
+    """Check if latexdiff is available on the system (probed once per run)"""
+    if shutil.which('latexdiff') is None:
+        return False
     try:
         result = subprocess.run(['latexdiff', '--version'], 
                               capture_output=True, text=True, timeout=10)
@@ -32,33 +146,42 @@ def check_latexdiff_available():
     except Exception as e:
         return False
 
-def run_latexdiff(original_file, corrected_file, diff_file):
-    """Run latexdiff to create a highlighted diff file"""
+def start_latexdiff(original_file, corrected_file, diff_file):
+    """Start latexdiff in the background, writing the highlighted diff to diff_file"""
     try:
         # Use CCHANGEBAR type for colored highlighting
         cmd = ['latexdiff', '--type=CCHANGEBAR', original_file, corrected_file]
         
-        print(f"Running latexdiff to create highlighted diff...")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        # The child process keeps its own handle on the output file
+        with open(diff_file, 'w', encoding='utf-8') as f:
+            return subprocess.Popen(cmd, stdout=f, stderr=subprocess.PIPE, text=True)
+            
+    except Exception as e:
+        print(f"Error running latexdiff: {str(e)}")
+        return None
+
+def finish_latexdiff(proc, diff_file, timeout=120):
+    """Wait for a latexdiff process started by start_latexdiff and report the result"""
+    try:
+        _, stderr = proc.communicate(timeout=timeout)
         
-        if result.returncode == 0:
-            # Write the diff output to file
-            with open(diff_file, 'w', encoding='utf-8') as f:
-                f.write(result.stdout)
+        if proc.returncode == 0:
             print(f"Diff file created successfully: {diff_file}")
             return True
         else:
-            print(f"latexdiff failed with return code {result.returncode}")
-            if result.stderr:
-                print(f"Error output: {result.stderr}")
-            return False
+            print(f"latexdiff failed with return code {proc.returncode}")
+            if stderr:
+                print(f"Error output: {stderr}")
             
     except subprocess.TimeoutExpired:
-        print("latexdiff timed out after 120 seconds")
-        return False
-    except Exception as e:
-        print(f"Error running latexdiff: {str(e)}")
-        return False
+        proc.kill()
+        proc.communicate()
+        print(f"latexdiff timed out after {timeout} seconds")
+    
+    # Don't leave a partial diff behind
+    if os.path.exists(diff_file):
+        os.remove(diff_file)
+    return False
 
 def load_system_prompt():
     """Load the system prompt from general_prompt.txt"""
@@ -69,13 +192,65 @@ def load_system_prompt():
         print("Warning: general_prompt.txt not found. Using default prompt.")
         return "You are a scientific proofreader. Correct the text and highlight changes with \\hl{}."
 
-def send_to_llm(text, system_prompt, retry_count=0):
-    """Send text to LLM for proofreading with retry logic"""
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_CONFIG['api_key']}",
-        "Content-Type": "application/json"
-    }
-    
+def open_response_cache():
+    """Open (creating if needed) the on-disk response cache; runs uncached if that fails"""
+    global RESPONSE_CACHE
+    try:
+        RESPONSE_CACHE = sqlite3.connect(CACHE_FILE)
+        RESPONSE_CACHE.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, resp TEXT)")
+        RESPONSE_CACHE.commit()
+    except sqlite3.Error as e:
+        print(f"Warning: Could not open response cache {CACHE_FILE}: {str(e)}")
+        close_response_cache()
+
+def close_response_cache():
+    """Close the on-disk response cache if it is open"""
+    global RESPONSE_CACHE
+    if RESPONSE_CACHE is not None:
+        RESPONSE_CACHE.close()
+        RESPONSE_CACHE = None
+
+def cache_key(text, system_prompt):
+    """Key identifying a proofreading request: same model, prompt and text give the same answer"""
+    return hashlib.sha256((OPENROUTER_CONFIG['model'] + system_prompt + text).encode('utf-8')).hexdigest()
+
+def cache_get(text, system_prompt):
+    """Return the cached corrected text, or None if not cached"""
+    if RESPONSE_CACHE is None:
+        return None
+    try:
+        row = RESPONSE_CACHE.execute("SELECT resp FROM cache WHERE key = ?",
+                                     (cache_key(text, system_prompt),)).fetchone()
+    except sqlite3.Error as e:
+        print(f"  → Warning: Could not read response cache: {str(e)}")
+        return None
+    return row[0] if row else None
+
+def cache_put(text, system_prompt, corrected_text):
+    """Store a successful response in the cache (best effort: failures only print a warning)"""
+    if RESPONSE_CACHE is None:
+        return
+    try:
+        with RESPONSE_CACHE:
+            RESPONSE_CACHE.execute("INSERT OR REPLACE INTO cache (key, resp) VALUES (?, ?)",
+                                   (cache_key(text, system_prompt), corrected_text))
+    except sqlite3.Error as e:
+        print(f"  → Warning: Could not write response cache: {str(e)}")
+
+def dumps_json(obj) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+def loads_json(data):
+    """Parse JSON from bytes or str, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def build_payload(text, system_prompt, response_format=None, stream=False):
+    """Build the chat completion request body for proofreading text"""
     payload = {
         "model": OPENROUTER_CONFIG["model"],
         "messages": [
@@ -84,32 +259,410 @@ def send_to_llm(text, system_prompt, retry_count=0):
         ],
         "temperature": OPENROUTER_CONFIG["temperature"]
     }
+    if response_format is not None:
+        payload["response_format"] = response_format
+    if stream:
+        payload["stream"] = True
+    return payload
+
+async def read_stream(response):
+    """Assemble the message content of a streamed (server-sent events) chat completion"""
+    parts = []
+    received = False
+    done = False
+    finish_reason = None
+    async for line in response.content:
+        line = line.strip()
+        if not line.startswith(b'data:'):
+            continue  # event separators and ": keep-alive" comments
+        data = line[5:].strip()
+        if data == b'[DONE]':
+            done = True
+            break
+        chunk = loads_json(data)
+        if 'error' in chunk:
+            raise Exception(f"API returned an error while streaming: {chunk['error']}")
+        if chunk.get('choices'):
+            received = True
+            choice = chunk['choices'][0]
+            parts.append(choice.get('delta', {}).get('content') or '')
+            finish_reason = choice.get('finish_reason') or finish_reason
+    
+    if not received:
+        raise Exception("Invalid response format from API")
+    # A connection closed before [DONE] would otherwise pass off a partial answer as complete
+    if not done:
+        raise Exception("Stream ended before the response was complete")
+    if finish_reason == 'length':
+        raise Exception("Response was cut off at the model's output token limit")
+    return ''.join(parts)
+
+async def send_to_llm_async(session, text, system_prompt, sem, limiter, response_format=None, retry_count=0):
+    """Send text to LLM for proofreading with retry logic"""
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_CONFIG['api_key']}",
+        "Content-Type": "application/json"
+    }
     
+    if response_format is None:
+        cached = cache_get(text, system_prompt)
+        if cached is not None:
+            return cached
+    
+    stream = OPENROUTER_CONFIG['stream']
+    payload = build_payload(text, system_prompt, response_format, stream)
+    request_options = {}  # The session's default timeout applies unless overridden
+    if stream:
+        request_options['timeout'] = aiohttp.ClientTimeout(total=OPENROUTER_CONFIG["timeout"],
+                                                           connect=CONNECT_TIMEOUT,
+                                                           sock_read=STREAM_STALL_TIMEOUT)
+    
+    retry_after = None
     try:
-        response = requests.post(
-            f"{OPENROUTER_CONFIG['base_url']}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=OPENROUTER_CONFIG["timeout"]
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if 'choices' in result and len(result['choices']) > 0:
-                return result['choices'][0]['message']['content'].strip()
-            else:
-                raise Exception("Invalid response format from API")
-        else:
-            raise Exception(f"API returned status code {response.status_code}: {response.text}")
+        async with sem, limiter:
+            async with session.post(
+                f"{OPENROUTER_CONFIG['base_url']}/chat/completions",
+                headers=headers,
+                data=dumps_json(payload),
+                **request_options
+            ) as response:
+                if response.status == 200:
+                    if stream:
+                        corrected_text = (await read_stream(response)).strip()
+                    else:
+                        result = loads_json(await response.read())
+                        if 'choices' in result and len(result['choices']) > 0:
+                            if result['choices'][0].get('finish_reason') == 'length':
+                                raise Exception("Response was cut off at the model's output token limit")
+                            corrected_text = result['choices'][0]['message']['content'].strip()
+                        else:
+                            raise Exception("Invalid response format from API")
+                else:
+                    if response.status == 429:
+                        retry_after = response.headers.get('Retry-After')
+                    raise Exception(f"API returned status code {response.status}: {await response.text()}")
             
     except Exception as e:
         if retry_count < OPENROUTER_CONFIG["max_retries"]:
             print(f"  → API call failed, retrying ({retry_count + 1}/{OPENROUTER_CONFIG['max_retries']})...")
-            time.sleep(2 ** retry_count)  # Exponential backoff
-            return send_to_llm(text, system_prompt, retry_count + 1)
+            # Exponential backoff with jitter so concurrent retries don't hit the API in lockstep;
+            # asyncio.sleep keeps the other in-flight requests running meanwhile
+            delay = (2 ** retry_count) + random.random()
+            if retry_after is not None:
+                try:
+                    delay = float(retry_after)  # Rate limited: wait as long as the API asks
+                except ValueError:
+                    pass
+            await asyncio.sleep(delay)
+            return await send_to_llm_async(session, text, system_prompt, sem, limiter, response_format, retry_count + 1)
         else:
             print(f"  → Failed after {OPENROUTER_CONFIG['max_retries']} retries: {str(e)}")
             return text  # Return original text on failure
+    
+    # Outside the retry handler: a cache problem must not re-send (and re-bill) a good response
+    if response_format is None:
+        cache_put(text, system_prompt, corrected_text)
+    return corrected_text
+
+def marshal_batch(texts):
+    """Build a single prompt asking the LLM to proofread several short texts at once"""
+    return (
+        "Proofread each item of the following JSON array independently. "
+        "Return a JSON object of the form {\"items\": [...]} containing the corrected "
+        "text of every item, in the same order, and nothing else.\n\n"
+        + json.dumps(texts, ensure_ascii=False)
+    )
+
+def unmarshal_batch(response, texts):
+    """
+    Extract the list of corrected texts from a marshaled batch response.
+    Returns None if the response is malformed; otherwise one entry per text,
+    None for any item that looks corrupted compared to its source text.
+    """
+    response = response.strip()
+    # Some models wrap JSON output in a markdown code fence
+    if response.startswith('```'):
+        response = response.strip('`').strip()
+        if response.startswith('json'):
+            response = response[4:]
+    try:
+        items = loads_json(response).get('items')
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(items, list) or len(items) != len(texts) or not all(isinstance(item, str) for item in items):
+        return None
+    results = []
+    for item, text in zip(items, texts):
+        # A single-backslash LaTeX command in a JSON string still parses, but turns into a
+        # control character (\textbf -> tab + "extbf") and the command disappears
+        if (not set(_CONTROL_CHAR_RE.findall(item)) <= set(_CONTROL_CHAR_RE.findall(text))
+                or set(_COMMAND_RE.findall(item)) != set(_COMMAND_RE.findall(text))):
+            results.append(None)
+        else:
+            results.append(item.strip())
+    return results
+
+async def send_batch_to_llm_async(session, texts, system_prompt, sem, limiter):
+    """Proofread several short texts in one request, falling back to one request per text"""
+    corrected_texts = [cache_get(text, system_prompt) for text in texts]
+    missing = [i for i, corrected_text in enumerate(corrected_texts) if corrected_text is None]
+    if not missing:
+        return corrected_texts
+    
+    pending = [texts[i] for i in missing]
+    response = await send_to_llm_async(session, marshal_batch(pending), system_prompt, sem, limiter,
+                                       response_format={"type": "json_object"})
+    results = unmarshal_batch(response, pending) or [None] * len(pending)
+    for text, corrected_text in zip(pending, results):
+        if corrected_text is not None:
+            cache_put(text, system_prompt, corrected_text)
+    
+    # Items missing from the batched response are proofread one request each
+    retry = [j for j, corrected_text in enumerate(results) if corrected_text is None]
+    if retry:
+        print(f"  → Could not use batched response for {len(retry)} of {len(pending)} items, proofreading them individually...")
+        retried = await asyncio.gather(
+            *[send_to_llm_async(session, pending[j], system_prompt, sem, limiter) for j in retry])
+        for j, corrected_text in zip(retry, retried):
+            results[j] = corrected_text
+    
+    for i, corrected_text in zip(missing, results):
+        corrected_texts[i] = corrected_text
+    return corrected_texts
+
+def _split_for_llm(text, max_chars=MAX_CHUNK_CHARS):
+    """
+    Split text at sentence boundaries into chunks of at most max_chars where possible
+    (a single longer sentence becomes its own chunk). Each chunk keeps its trailing
+    whitespace, so ''.join(chunks) == text. Breaks inside a brace group (e.g. a
+    \footnote{...}) or inside math are never used, so every chunk stays balanced.
+    """
+    chunks = []
+    chunk_start = 0
+    last_break = 0
+    depth = 0
+    in_math = False
+    i = 0
+    for m in _SENTENCE_BREAK_RE.finditer(text):
+        # Track brace depth and math mode up to this candidate break
+        while i < m.start():
+            if text[i] == '\\':
+                if text[i + 1:i + 2] in ('(', '['):
+                    in_math = True
+                elif text[i + 1:i + 2] in (')', ']'):
+                    in_math = False
+                i += 2  # skip the escaped character (\{, \$, ...)
+                continue
+            if text.startswith('$$', i):
+                in_math = not in_math
+                i += 2
+                continue
+            if text[i] == '{':
+                depth += 1
+            elif text[i] == '}':
+                depth = max(0, depth - 1)
+            elif text[i] == '$':
+                in_math = not in_math
+            i += 1
+        if depth > 0 or in_math:
+            continue
+        
+        if m.end() - chunk_start > max_chars and last_break > chunk_start:
+            chunks.append(text[chunk_start:last_break])
+            chunk_start = last_break
+        last_break = m.end()
+    if len(text) - chunk_start > max_chars and last_break > chunk_start:
+        chunks.append(text[chunk_start:last_break])
+        chunk_start = last_break
+    chunks.append(text[chunk_start:])
+    return chunks
+
+async def _drive(elements, system_prompt):
+    """Proofread all elements concurrently and return the results in input order"""
+    concurrency = OPENROUTER_CONFIG['concurrency']
+    sem = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(OPENROUTER_CONFIG['rpm'], 60)
+    # All requests go to one host, so let it use the whole pool, and keep its
+    # address and warm TLS connections around for the duration of the run
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency,
+                                     use_dns_cache=True, ttl_dns_cache=DNS_CACHE_TTL,
+                                     keepalive_timeout=KEEPALIVE_TIMEOUT)
+    timeout = aiohttp.ClientTimeout(total=OPENROUTER_CONFIG['timeout'], connect=CONNECT_TIMEOUT)
+    completed = 0
+    
+    # Send each distinct text only once and share the result between its occurrences
+    occurrences = {}
+    for i, element in enumerate(elements):
+        occurrences.setdefault(element.text, []).append(i)
+    unique = [indices[0] for indices in occurrences.values()]
+    
+    def report(element, corrected_text):
+        nonlocal completed
+        status = "Text corrected" if corrected_text != element.text else "No changes needed"
+        for i in occurrences[element.text]:
+            completed += 1
+            print(f"[{completed}/{len(elements)}] {elements[i].label} → {status}")
+    
+    async def proofread(session, element):
+        if len(element.text) > MAX_CHUNK_CHARS:
+            # Proofread the sentence chunks in parallel and put them back together
+            # with their original separating whitespace
+            chunks = _split_for_llm(element.text)
+            corrected_chunks = await asyncio.gather(
+                *[send_to_llm_async(session, chunk.rstrip(), system_prompt, sem, limiter) for chunk in chunks])
+            corrected_text = ''.join(corrected_chunk + chunk[len(chunk.rstrip()):]
+                                     for chunk, corrected_chunk in zip(chunks, corrected_chunks))
+        else:
+            corrected_text = await send_to_llm_async(session, element.text, system_prompt, sem, limiter)
+        report(element, corrected_text)
+        return corrected_text
+    
+    async def proofread_batch(session, batch):
+        corrected_texts = await send_batch_to_llm_async(session, [e.text for e in batch], system_prompt, sem, limiter)
+        for element, corrected_text in zip(batch, corrected_texts):
+            report(element, corrected_text)
+        return corrected_texts
+    
+    # Group short elements into batches; everything else gets its own request
+    short = [i for i in unique if len(elements[i].text) < MARSHAL_MAX_CHARS]
+    batches = [short[i:i + MARSHAL_BATCH_SIZE] for i in range(0, len(short), MARSHAL_BATCH_SIZE)]
+    batches = [batch for batch in batches if len(batch) > 1]
+    batched = {i for batch in batches for i in batch}
+    singles = [i for i in unique if i not in batched]
+    
+    # All element types go into one task pool. Start the biggest jobs first so long
+    # paragraphs don't end up as a slow tail after the pool has drained.
+    # A job is a list of element indices; only marshaled batches have more than one
+    jobs = [[i] for i in singles] + batches
+    jobs.sort(key=lambda job: sum(len(elements[i].text) for i in job), reverse=True)
+    
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [proofread_batch(session, [elements[i] for i in job]) if len(job) > 1
+                 else proofread(session, elements[job[0]]) for job in jobs]
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # Map results back to the original element order, including repeated texts
+    results = [None] * len(elements)
+    for job, outcome in zip(jobs, outcomes):
+        for j, i in enumerate(job):
+            result = outcome[j] if len(job) > 1 and not isinstance(outcome, Exception) else outcome
+            for k in occurrences[elements[i].text]:
+                results[k] = result
+    return results
+
+def submit_batch(elements, system_prompt, batch_input_path):
+    """
+    Upload all elements as a Batch API job and return the batch id.
+    The requests are staged in batch_input_path, which is removed after the upload attempt.
+    """
+    headers = {"Authorization": f"Bearer {OPENROUTER_CONFIG['api_key']}"}
+    
+    with open(batch_input_path, 'w', encoding='utf-8') as f:
+        for idx, element in enumerate(elements):
+            request = {
+                "custom_id": str(idx),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": build_payload(element.text, system_prompt)
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+    
+    print(f"Uploading {len(elements)} requests from {batch_input_path}...")
+    try:
+        with open(batch_input_path, 'rb') as f:
+            response = HTTP_SESSION.post(
+                f"{OPENROUTER_CONFIG['base_url']}/files",
+                headers=headers,
+                files={"file": (os.path.basename(batch_input_path), f)},
+                data={"purpose": "batch"},
+                timeout=OPENROUTER_CONFIG["timeout"]
+            )
+    finally:
+        # Don't leave a copy of the manuscript behind, whether or not the upload worked
+        os.remove(batch_input_path)
+    if response.status_code != 200:
+        raise Exception(f"File upload returned status code {response.status_code}: {response.text}")
+    input_file_id = response.json()['id']
+    
+    response = HTTP_SESSION.post(
+        f"{OPENROUTER_CONFIG['base_url']}/batches",
+        headers=headers,
+        json={
+            "input_file_id": input_file_id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h"
+        },
+        timeout=OPENROUTER_CONFIG["timeout"]
+    )
+    if response.status_code != 200:
+        raise Exception(f"Batch creation returned status code {response.status_code}: {response.text}")
+    return response.json()['id']
+
+def cancel_batch(batch_id):
+    """Ask the API to cancel a submitted Batch API job so it stops running (and billing)"""
+    try:
+        response = HTTP_SESSION.post(
+            f"{OPENROUTER_CONFIG['base_url']}/batches/{batch_id}/cancel",
+            headers={"Authorization": f"Bearer {OPENROUTER_CONFIG['api_key']}"},
+            timeout=OPENROUTER_CONFIG["timeout"]
+        )
+        if response.status_code == 200:
+            print(f"Cancelled batch {batch_id}.")
+        else:
+            print(f"Could not cancel batch {batch_id} (status code {response.status_code}): {response.text}")
+    except Exception as e:
+        print(f"Could not cancel batch {batch_id}: {str(e)}")
+
+def collect_batch_results(batch_id, elements):
+    """Wait for a Batch API job to finish and return the corrected texts in element order"""
+    headers = {"Authorization": f"Bearer {OPENROUTER_CONFIG['api_key']}"}
+    
+    while True:
+        response = HTTP_SESSION.get(
+            f"{OPENROUTER_CONFIG['base_url']}/batches/{batch_id}",
+            headers=headers,
+            timeout=OPENROUTER_CONFIG["timeout"]
+        )
+        if response.status_code != 200:
+            raise Exception(f"Batch status check returned status code {response.status_code}: {response.text}")
+        batch = response.json()
+        
+        counts = batch.get('request_counts') or {}
+        print(f"  Batch {batch_id}: {batch['status']} ({counts.get('completed', 0)}/{counts.get('total', len(elements))} requests done)")
+        if batch['status'] == 'completed':
+            break
+        if batch['status'] in ('failed', 'expired', 'cancelled'):
+            raise Exception(f"Batch {batch_id} ended with status '{batch['status']}'")
+        time.sleep(BATCH_POLL_INTERVAL)
+    
+    results = [element.text for element in elements]  # Keep original text for failed requests
+    if not batch.get('output_file_id'):
+        print("  → Batch produced no output, keeping original text")
+        return results
+    
+    response = HTTP_SESSION.get(
+        f"{OPENROUTER_CONFIG['base_url']}/files/{batch['output_file_id']}/content",
+        headers=headers,
+        timeout=OPENROUTER_CONFIG["timeout"]
+    )
+    if response.status_code != 200:
+        raise Exception(f"Batch output download returned status code {response.status_code}: {response.text}")
+    
+    for line in response.text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        idx = int(record['custom_id'])
+        body = (record.get('response') or {}).get('body') or {}
+        if body.get('choices'):
+            results[idx] = body['choices'][0]['message']['content'].strip()
+        else:
+            print(f"  → Request failed for {elements[idx].label}, keeping original text")
+    
+    for idx, (element, corrected_text) in enumerate(zip(elements, results), 1):
+        status = "Text corrected" if corrected_text != element.text else "No changes needed"
+        print(f"[{idx}/{len(elements)}] {element.label} → {status}")
+    return results
 
 def get_user_input():
     """Get input file path from user with validation"""
@@ -170,8 +723,9 @@ def generate_output_paths(input_path: str):
     # Generate output paths
     corrected_path = os.path.join(input_dir, f"{base_name}_corrected.tex")
     diff_path = os.path.join(input_dir, f"{base_name}_diff.tex")
+    batch_input_path = os.path.join(input_dir, f"{base_name}_batch_input.jsonl")
     
-    return corrected_path, diff_path
+    return corrected_path, diff_path, batch_input_path
 
 def confirm_processing(input_path: str, corrected_path: str, diff_path: str):
     """Show user what will be generated and get confirmation"""
@@ -179,7 +733,9 @@ def confirm_processing(input_path: str, corrected_path: str, diff_path: str):
     print("Processing plan:")
     print(f"  Input file:     {input_path}")
     print(f"  Corrected file: {corrected_path}")
-    if check_latexdiff_available():
+    if diff_path is None:
+        print("  (diff generation disabled - only corrected version will be generated)")
+    elif check_latexdiff_available():
         print(f"  Diff file:      {diff_path}")
         print("  (latexdiff is available - diff highlighting will be generated)")
     else:
@@ -190,7 +746,7 @@ def confirm_processing(input_path: str, corrected_path: str, diff_path: str):
     existing_files = []
     if os.path.exists(corrected_path):
         existing_files.append(corrected_path)
-    if os.path.exists(diff_path):
+    if diff_path is not None and os.path.exists(diff_path):
         existing_files.append(diff_path)
         
     if existing_files:
@@ -209,220 +765,200 @@ def confirm_processing(input_path: str, corrected_path: str, diff_path: str):
         else:
             print("Please enter 'y' for yes or 'n' for no.")
 
-def get_section_context(content: str, position: int) -> str:
+def _worth_proofing(stripped: str) -> bool:
+    """Check whether an (already stripped) paragraph contains enough prose to be worth sending to the LLM"""
+    if stripped.startswith('$$'):
+        return False
+    return len(_MARKUP_RE.sub('', stripped).strip()) >= MIN_PROSE_CHARS
+
+def find_closing_brace(content: str, brace_pos: int):
     """
-    Find the current section context for a given position in the document.
-    Returns the most recent section/subsection title before the position.
+    Find the brace matching the opening brace at brace_pos, handling nested braces.
+    Returns the position just after the closing brace, or None if it is unbalanced.
     """
-    # Look backwards from position to find the most recent section
-    text_before = content[:position]
-    
-    # Find all section commands before this position
-    section_pattern = r'\\(chapter|section|subsection|subsubsection|paragraph|subparagraph)\s*\{([^}]*)\}'
-    sections = list(re.finditer(section_pattern, text_before))
+    brace_count = 1
+    i = brace_pos + 1
+    while i < len(content) and brace_count > 0:
+        if content[i] == '{':
+            brace_count += 1
+        elif content[i] == '}':
+            brace_count -= 1
+        i += 1
     
-    if not sections:
-        return "Document Start"
-    
-    # Get the last (most recent) section
-    last_section = sections[-1]
-    section_type = last_section.group(1)
-    section_title = last_section.group(2).strip()
-    
-    return f"{section_type.title()}: \"{section_title}\""
+    return i if brace_count == 0 else None
+
+def _lookup_section(position: int, section_index) -> str:
+    """
+    Find the current section context for a given position in the document.
+    section_index is a list of (title_position, description) sorted by position;
+    returns the description of the most recent section title before the position.
+    """
+    i = bisect.bisect_left(section_index, (position,)) - 1
+    return section_index[i][1] if i >= 0 else "Document Start"
 
-def process_file(input_path: str, output_path: str):
+def process_file(input_path: str, output_path: str, diff_path: str = None,
+                 use_batch: bool = False, use_cache: bool = True):
     print("Loading configuration and system prompt...")
     system_prompt = load_system_prompt()
     
     print(f"Parsing LaTeX file: {input_path}")
     # 1) load
-    content = open(input_path, 'r', encoding='utf-8').read()
-
-    # 2) parse for sectioning macros
-    walker = LatexWalker(content)
-    nodes, _, _ = walker.get_latex_nodes()
+    content = Path(input_path).read_text(encoding='utf-8')
 
     edits = []
-    section_cmds = {
-        'section','subsection','subsubsection',
-        'paragraph','subparagraph','chapter'
-    }
 
-    # Collect section titles
+    # 2) discover section titles, environments (abstract, highlights, keywords),
+    # captions and paragraphs in a single pass over the document
     section_titles = []
-    for node in nodes:
-        if isinstance(node, LatexMacroNode) and node.macroname in section_cmds:
-            arglist = getattr(node.nodeargd, 'argnlist', None)
-            if arglist:
-                grp = arglist[0].node  # this is a LatexGroupNode
-                inner = content[grp.pos+1 : grp.pos_end-1]
-                section_titles.append((grp.pos, grp.pos_end, inner, node.macroname))
-
-    # 3) detect LaTeX environments (abstract, highlights, keywords)
-    environments = ['abstract', 'highlights', 'keywords']
     env_elements = []
-    
-    for env_name in environments:
-        pattern = rf'\\begin\{{{env_name}\}}(.*?)\\end\{{{env_name}\}}'
-        for match in re.finditer(pattern, content, re.DOTALL):
-            env_content = match.group(1).strip()
-            env_elements.append((match.start(), match.end(), env_content, env_name))
-
-    # 4) regex for \caption{…} - improved to handle nested braces
     captions = []
-    pos = 0
-    while True:
-        # Find \caption{
-        match = re.search(r'\\caption\s*\{', content[pos:])
-        if not match:
-            break
-        
-        start_pos = pos + match.start()
-        brace_pos = pos + match.end() - 1  # position of opening brace
-        
-        # Find matching closing brace
-        brace_count = 1
-        i = brace_pos + 1
-        while i < len(content) and brace_count > 0:
-            if content[i] == '{':
-                brace_count += 1
-            elif content[i] == '}':
-                brace_count -= 1
-            i += 1
-        
-        if brace_count == 0:  # Found matching brace
-            end_pos = i
-            orig = content[brace_pos + 1:i - 1]  # content between braces
-            captions.append((start_pos, end_pos, orig))
-            pos = end_pos
-        else:
-            pos = start_pos + match.end()
-
-    # 5) regex for paragraphs = text blocks separated by blank lines
-    para_pat = re.compile(r'(?:\n|^)([^\n][\s\S]*?)(?=\n\s*\n)', re.MULTILINE)
     paragraphs = []
-    for m in para_pat.finditer(content):
-        para = m.group(1)
-        # skip if it's purely a macro, empty, or a comment
-        if (para.strip().startswith('\\') or 
-            para.strip().startswith('%') or 
-            not para.strip()):
+    section_index = []  # Section context lookup table, in document order
+    para_start = 0
+    para_nested = False  # whether para_start lies inside an element found earlier
+    covered_end = 0  # end of the last environment, caption or title found
+    for m in _TOKEN_RE.finditer(content):
+        if m.group('para'):
+            # paragraphs = text blocks separated by blank lines
+            para = content[para_start:m.start()]
+            stripped = para.strip()
+            # skip if it's purely a macro, empty, a comment, (almost) only math and markup,
+            # or starts inside an element found earlier (its edit could never be applied)
+            if (stripped and not stripped.startswith(('\\', '%')) and _worth_proofing(stripped)
+                    and not para_nested):
+                # Elements starting inside this paragraph are proofread as part of it, unless
+                # one runs past its end (an environment spanning blank lines); then keep that instead
+                inner = [found for found in (section_titles, env_elements, captions)
+                         if found and found[-1][0] >= para_start]
+                if all(found[-1][1] <= m.start() for found in inner):
+                    for found in inner:
+                        while found and found[-1][0] >= para_start:
+                            found.pop()
+                    paragraphs.append((para_start, m.start(), para))
+            para_start = m.end()
+            para_nested = para_start < covered_end
             continue
-        paragraphs.append((m.start(1), m.end(1), para))
+        
+        if m.start() < covered_end:
+            continue  # nested inside an environment, caption or title found earlier
+        if _COMMENT_RE.search(content, content.rfind('\n', 0, m.start()) + 1, m.start()):
+            continue  # commented out
+        if m.group('begin'):
+            env_name = m.group('env')
+            end_tag = f"\\end{{{env_name}}}"
+            env_end = content.find(end_tag, m.end())
+            if env_end != -1:
+                env_content = content[m.end():env_end].strip()
+                env_elements.append((m.start(), env_end + len(end_tag), env_content, env_name))
+                covered_end = env_end + len(end_tag)
+        elif m.group('cap'):
+            end_pos = find_closing_brace(content, m.end() - 1)
+            if end_pos is not None:
+                captions.append((m.start(), end_pos, content[m.end():end_pos - 1]))
+                covered_end = end_pos
+        else:
+            end_pos = find_closing_brace(content, m.end() - 1)
+            if end_pos is not None:
+                # Positions of the title itself, without the surrounding braces
+                title = content[m.end():end_pos - 1]
+                section_titles.append((m.end(), end_pos - 1, title, m.group('macro')))
+                section_index.append((m.end(), f"{m.group('macro').title()}: \"{title.strip()}\""))
+                covered_end = end_pos
 
     # Print summary of found elements
     print(f"Found {len(section_titles)} section titles, {len([e for e in env_elements if e[3] == 'abstract'])} abstract, {len([e for e in env_elements if e[3] == 'highlights'])} highlights, {len([e for e in env_elements if e[3] == 'keywords'])} keywords, {len(captions)} captions, {len(paragraphs)} paragraphs")
     print()
 
-    # Process section titles
-    if section_titles:
-        print("Processing section titles...")
-        for i, (start_pos, end_pos, inner, macro_name) in enumerate(section_titles, 1):
-            print(f"[{i}/{len(section_titles)}] Processing {macro_name}: \"{inner.strip()[:50]}{'...' if len(inner.strip()) > 50 else ''}\" ({len(inner)} chars)")
-            
-            corrected_text = send_to_llm(inner, system_prompt)
-            if corrected_text != inner:
-                print(f"  → Text corrected")
-            else:
-                print(f"  → No changes needed")
-            
-            replacement = '{' + corrected_text + '}'
-            edits.append((start_pos + (end_pos - start_pos - len(inner) - 2), end_pos - 1, replacement))
-        print()
+    def preview(text):
+        return f"\"{text.strip()[:50]}{'...' if len(text.strip()) > 50 else ''}\""
 
-    # Process environments
-    for env_name in environments:
-        env_items = [e for e in env_elements if e[3] == env_name]
-        if env_items:
-            print(f"Processing {env_name}...")
-            for i, (start_pos, end_pos, env_content, _) in enumerate(env_items, 1):
-                section_context = get_section_context(content, start_pos)
-                print(f"[{i}/{len(env_items)}] Processing {env_name} in {section_context} ({len(env_content)} chars)")
-                
-                corrected_text = send_to_llm(env_content, system_prompt)
-                if corrected_text != env_content:
-                    print(f"  → Text corrected")
-                else:
-                    print(f"  → No changes needed")
-                
-                repl = f"\\begin{{{env_name}}}{corrected_text}\\end{{{env_name}}}"
-                edits.append((start_pos, end_pos, repl))
-            print()
+    # Collect every element first so all API calls can be dispatched at once
+    elements = []
+    for start_pos, end_pos, inner, macro_name in section_titles:
+        elements.append(Element('section', start_pos, end_pos, inner,
+                                f"{macro_name}: {preview(inner)} ({len(inner)} chars)"))
+    for env_name in ENVIRONMENTS:
+        for start_pos, end_pos, env_content, _ in [e for e in env_elements if e[3] == env_name]:
+            section_context = _lookup_section(start_pos, section_index)
+            elements.append(Element(env_name, start_pos, end_pos, env_content,
+                                    f"{env_name} in {section_context} ({len(env_content)} chars)"))
+    for start_pos, end_pos, orig in captions:
+        section_context = _lookup_section(start_pos, section_index)
+        elements.append(Element('caption', start_pos, end_pos, orig,
+                                f"caption in {section_context}: {preview(orig)} ({len(orig)} chars)"))
+    for start_pos, end_pos, para in paragraphs:
+        section_context = _lookup_section(start_pos, section_index)
+        elements.append(Element('paragraph', start_pos, end_pos, para,
+                                f"paragraph in {section_context}: {preview(para)} ({len(para.strip())} chars)"))
 
-    # Process captions
-    if captions:
-        print("Processing captions...")
-        for i, (start_pos, end_pos, orig) in enumerate(captions, 1):
-            section_context = get_section_context(content, start_pos)
-            print(f"[{i}/{len(captions)}] Processing caption in {section_context}: \"{orig.strip()[:50]}{'...' if len(orig.strip()) > 50 else ''}\" ({len(orig)} chars)")
-            
-            corrected_text = send_to_llm(orig, system_prompt)
-            if corrected_text != orig:
-                print(f"  → Text corrected")
-            else:
-                print(f"  → No changes needed")
-            
-            repl = f"\\caption{{{corrected_text}}}"
-            edits.append((start_pos, end_pos, repl))
+    if elements and use_batch:
+        _, _, batch_input_path = generate_output_paths(input_path)
+        batch_id = submit_batch(elements, system_prompt, batch_input_path)
+        print(f"Submitted batch {batch_id}; results can take up to 24 hours.")
+        print(f"Checking status every {BATCH_POLL_INTERVAL} seconds (Ctrl+C to cancel the batch)...")
+        try:
+            results = collect_batch_results(batch_id, elements)
+        except KeyboardInterrupt:
+            # Its results could never be applied, so don't leave the job running
+            print("\nCancelling batch...")
+            cancel_batch(batch_id)
+            raise
         print()
-
-    # Process paragraphs
-    if paragraphs:
-        print("Processing paragraphs...")
-        for i, (start_pos, end_pos, para) in enumerate(paragraphs, 1):
-            section_context = get_section_context(content, start_pos)
-            print(f"[{i}/{len(paragraphs)}] Processing paragraph in {section_context}: \"{para.strip()[:50]}{'...' if len(para.strip()) > 50 else ''}\" ({len(para.strip())} chars)")
-            
-            corrected_text = send_to_llm(para, system_prompt)
-            if corrected_text != para:
-                print(f"  → Text corrected")
-            else:
-                print(f"  → No changes needed")
-            
-            edits.append((start_pos, end_pos, corrected_text))
+    elif elements:
+        print(f"Processing {len(elements)} elements (up to {OPENROUTER_CONFIG['concurrency']} concurrent requests)...")
+        if use_cache:
+            open_response_cache()
+        try:
+            results = asyncio.run(_drive(elements, system_prompt))
+        finally:
+            close_response_cache()
         print()
+    else:
+        results = []
+
+    for element, corrected_text in zip(elements, results):
+        if isinstance(corrected_text, Exception):
+            print(f"  → Failed to process {element.label}: {str(corrected_text)}")
+            corrected_text = element.text
+        
+        if element.kind in ('section', 'paragraph'):
+            edits.append((element.start, element.end, corrected_text))
+        elif element.kind == 'caption':
+            edits.append((element.start, element.end, f"\\caption{{{corrected_text}}}"))
+        else:
+            edits.append((element.start, element.end, f"\\begin{{{element.kind}}}{corrected_text}\\end{{{element.kind}}}"))
 
     print("Applying corrections to document...")
-    # 6) apply all edits in reverse order so offsets stay valid
-    edits.sort(key=lambda x: x[0], reverse=True)
-    out = content
+    # 6) apply all edits in a single forward pass, joining the pieces once
+    edits.sort(key=lambda x: x[0])
+    parts, cursor, applied = [], 0, 0
     for start, end, repl in edits:
-        out = out[:start] + repl + out[end:]
+        if start < cursor:
+            continue  # overlaps the previous edit, which already covers this text
+        parts.append(content[cursor:start])
+        parts.append(repl)
+        cursor = end
+        applied += 1
+    parts.append(content[cursor:])
+    out = ''.join(parts)
 
     # 7) write result
     print(f"Writing corrected output to: {output_path}")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(out)
+    Path(output_path).write_text(out, encoding='utf-8')
     
-    print(f"Processing complete! Total elements processed: {len(edits)}")
+    print(f"Processing complete! Total elements processed: {applied}")
     
-    # 8) Generate diff file using latexdiff
+    # 8) Start generating the diff file with latexdiff; the caller waits for it
+    if diff_path is None:
+        return None
     if check_latexdiff_available():
-        # Generate diff filename automatically
-        base_name = os.path.splitext(output_path)[0]
-        diff_file = f"{base_name}_diff.tex"
-        
-        print(f"latexdiff is available. Creating highlighted diff file...")
-        success = run_latexdiff(input_path, output_path, diff_file)
-        
-        if success:
-            print(f"Three files generated:")
-            print(f"  - Original: {input_path}")
-            print(f"  - Corrected: {output_path}")
-            print(f"  - Highlighted diff: {diff_file}")
-        else:
-            print(f"latexdiff failed, but corrected file was created successfully.")
-            print(f"Two files available:")
-            print(f"  - Original: {input_path}")
-            print(f"  - Corrected: {output_path}")
-    else:
-        print("latexdiff is not available on this system.")
-        print("Continuing with corrected version only.")
-        print(f"Two files available:")
-        print(f"  - Original: {input_path}")
-        print(f"  - Corrected: {output_path}")
-        print("To enable diff highlighting, please install latexdiff (usually part of texlive-extra-utils package)")
+        print(f"latexdiff is available. Creating highlighted diff file in the background...")
+        return start_latexdiff(input_path, output_path, diff_path)
+    
+    print("latexdiff is not available on this system.")
+    print("Continuing with corrected version only.")
+    print("To enable diff highlighting, please install latexdiff (usually part of texlive-extra-utils package)")
+    return None
 
 def load_config():
     """Load configuration from config.json or create it on first run"""
@@ -466,7 +1002,11 @@ def load_config():
             "model": "openai/chatgpt-4o-latest",
             "max_retries": 1,
             "timeout": 30,
-            "temperature": 0.1
+            "temperature": 0.1,
+            "concurrency": 20,
+            "rpm": 500,
+            "use_batch_api": False,
+            "stream": True
         }
         
         if test_api_key(test_config):
@@ -510,6 +1050,10 @@ def load_config():
             OPENROUTER_CONFIG.setdefault('max_retries', 3)
             OPENROUTER_CONFIG.setdefault('timeout', 120)
             OPENROUTER_CONFIG.setdefault('temperature', 0.1)
+            OPENROUTER_CONFIG.setdefault('concurrency', 20)
+            OPENROUTER_CONFIG.setdefault('rpm', 500)
+            OPENROUTER_CONFIG.setdefault('use_batch_api', False)
+            OPENROUTER_CONFIG.setdefault('stream', True)
             
         except json.JSONDecodeError as e:
             print(f"Error: Invalid JSON in {config_file}: {str(e)}")
@@ -535,7 +1079,7 @@ def test_api_key(config):
     }
     
     try:
-        response = requests.post(
+        response = HTTP_SESSION.post(
             f"{config['base_url']}/chat/completions",
             headers=headers,
             json=payload,
@@ -550,6 +1094,15 @@ def test_api_key(config):
 
 def main():
     """Main interactive interface"""
+    parser = argparse.ArgumentParser(description="Interactive LaTeX proofreader")
+    parser.add_argument('--batch', action='store_true',
+                        help="submit all requests as one Batch API job (cheaper, but may take up to 24 hours)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f"don't reuse or store LLM responses in {CACHE_FILE}")
+    parser.add_argument('--no-diff', action='store_true',
+                        help="skip generating the latexdiff highlighted diff file")
+    args = parser.parse_args()
+    
     try:
         # Load configuration first
         load_config()
@@ -558,7 +1111,9 @@ def main():
         input_path = get_user_input()
         
         # Generate output paths
-        corrected_path, diff_path = generate_output_paths(input_path)
+        corrected_path, diff_path, _ = generate_output_paths(input_path)
+        if args.no_diff:
+            diff_path = None
         
         # Show processing plan and get confirmation
         if not confirm_processing(input_path, corrected_path, diff_path):
@@ -568,8 +1123,10 @@ def main():
         print("Starting proofreading process...")
         print("-" * 40)
         
-        # Process the file
-        process_file(input_path, corrected_path)
+        # Process the file; latexdiff keeps running in the background
+        diff_proc = process_file(input_path, corrected_path, diff_path,
+                                 use_batch=args.batch or OPENROUTER_CONFIG['use_batch_api'],
+                                 use_cache=not args.no_cache)
         
         print()
         print("=" * 60)
@@ -578,8 +1135,12 @@ def main():
         
         # Show final summary
         files_created = [corrected_path]
-        if check_latexdiff_available() and os.path.exists(diff_path):
-            files_created.append(diff_path)
+        if diff_proc is not None:
+            print(f"You can start reviewing {corrected_path}")
+            print("Waiting for latexdiff to finish...")
+            if finish_latexdiff(diff_proc, diff_path):
+                files_created.append(diff_path)
+            print()
         
         print("Files created:")
         for file_path in files_created: